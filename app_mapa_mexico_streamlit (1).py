@@ -1,81 +1,228 @@
+import gzip
 import os
 import json
+try:
+    import orjson  # parser C, ~3-5x más rápido que json para estos archivos
+except ImportError:
+    orjson = None
+import numpy as np
+import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
 
 st.set_page_config(page_title="Mapa MX: Estados y Municipios", layout="wide")
 
 DATA_DIR = "data"
+META_PATH = os.path.join(DATA_DIR, "_meta.parquet")
 
 # ---------------------------
 # Utilidades de archivos
 # ---------------------------
+@st.cache_resource(show_spinner=False)
 def list_state_files(data_dir=DATA_DIR):
+    # Un solo scan de directorio por vida del servidor; reiniciar la app
+    # si se agregan archivos nuevos a ./data.
     if not os.path.isdir(data_dir):
         return {}
     mapping = {}
-    for f in os.listdir(data_dir):
-        if f.lower().endswith(".json") or f.lower().endswith(".geojson"):
-            path = os.path.join(data_dir, f)
-            name = os.path.splitext(f)[0]
-            mapping[name] = path
+    # os.scandir entrega nombre, ruta y tipo desde el dirent, sin el stat
+    # extra por entrada que hacen los envoltorios de pathlib/glob
+    with os.scandir(data_dir) as it:
+        for e in it:
+            f = e.name
+            if not e.is_file() or f.lower().endswith(".topojson"):
+                continue  # sidecar generado por build_topojson.py; se usa al cargar
+            if f.lower().endswith((".json", ".geojson", ".json.gz", ".geojson.gz")):
+                name = os.path.splitext(f)[0]
+                if name.lower().endswith((".json", ".geojson")):
+                    name = os.path.splitext(name)[0]  # quitar doble extensión .json.gz
+                    mapping[name] = e.path  # el .gz gana sobre el .json del mismo estado
+                else:
+                    mapping.setdefault(name, e.path)
     return dict(sorted(mapping.items(), key=lambda kv: kv[0].lower()))
 
-def load_geojson(path):
-    with open(path, "r", encoding="utf-8") as f:
+def parse_json_file(path):
+    # El GeoJSON comprime ~5-10x (llaves y números repetitivos): se aceptan
+    # archivos .gz tal cual (gzip -9 data/*.json)
+    opener = gzip.open if str(path).endswith(".gz") else open
+    if orjson is not None:
+        with opener(path, "rb") as f:
+            return orjson.loads(f.read())
+    with opener(path, "rt", encoding="utf-8") as f:
         return json.load(f)
 
+@st.cache_data(show_spinner=False)
+def load_geojson(path, mtime):
+    # `mtime` solo participa en la llave de caché: si el archivo cambia
+    # en disco la entrada se invalida y se vuelve a parsear.
+    return parse_json_file(path)
+
+# ---------------------------
+# TopoJSON (sidecars opcionales de build_topojson.py)
+# ---------------------------
+def topojson_to_featurecollection(topo):
+    """Decodifica un TopoJSON (arcos delta-codificados y cuantizados) a un
+    FeatureCollection GeoJSON normal. Solo Polygon/MultiPolygon, que es lo
+    que contienen los archivos por estado.
+    """
+    tr = topo.get("transform")
+    arcs = []
+    for arc in topo.get("arcs", []):
+        if tr:
+            sx, sy = tr["scale"]
+            tx, ty = tr["translate"]
+            x = y = 0
+            pts = []
+            for dx, dy in arc:
+                x += dx; y += dy
+                pts.append([x * sx + tx, y * sy + ty])
+        else:
+            pts = [list(p) for p in arc]
+        arcs.append(pts)
+
+    def ring(arc_idxs):
+        pts = []
+        for i in arc_idxs:
+            a = arcs[i] if i >= 0 else arcs[~i][::-1]
+            pts.extend(a if not pts else a[1:])
+        return pts
+
+    def decode_geom(g):
+        t = g.get("type")
+        if t == "Polygon":
+            return {"type": "Polygon", "coordinates": [ring(r) for r in g["arcs"]]}
+        if t == "MultiPolygon":
+            return {"type": "MultiPolygon", "coordinates": [[ring(r) for r in poly] for poly in g["arcs"]]}
+        return None
+
+    features = []
+    for obj in topo.get("objects", {}).values():
+        geoms = obj.get("geometries", []) if obj.get("type") == "GeometryCollection" else [obj]
+        for g in geoms:
+            geom = decode_geom(g)
+            if geom:
+                features.append({"type": "Feature", "properties": g.get("properties", {}), "geometry": geom})
+    return {"type": "FeatureCollection", "features": features}
+
+@st.cache_data(show_spinner=False)
+def load_topojson(path, mtime):
+    return topojson_to_featurecollection(parse_json_file(path))
+
+@st.cache_data(show_spinner=False)
+def load_meta(path, mtime):
+    # Sidecar de build_meta.py: una fila (muns, bounds) por estado.
+    return pd.read_parquet(path).set_index("state")
+
+def state_meta(estado):
+    """Fila de metadatos del estado, o None si no hay sidecar Parquet."""
+    if not os.path.exists(META_PATH):
+        return None
+    try:
+        meta = load_meta(META_PATH, os.path.getmtime(META_PATH))
+    except Exception:
+        return None
+    return meta.loc[estado] if estado in meta.index else None
+
+def state_cache_key(path):
+    """(ruta efectiva, mtime) del archivo que realmente se carga para el
+    estado (el sidecar .topojson si existe)."""
+    # Doble splitext como en list_state_files: "X.json.gz" debe dar
+    # "X.topojson", no "X.json.topojson".
+    stem = os.path.splitext(path)[0]
+    if path.endswith(".gz"):
+        stem = os.path.splitext(stem)[0]
+    topo_path = stem + ".topojson"
+    if os.path.exists(topo_path):
+        return topo_path, os.path.getmtime(topo_path)
+    return path, os.path.getmtime(path)
+
+def load_state_fc(path):
+    """Carga el FeatureCollection del estado, prefiriendo el sidecar
+    `.topojson` (cuantizado/simplificado offline) si existe.
+    """
+    real_path, mtime = state_cache_key(path)
+    if real_path.endswith(".topojson"):
+        return load_topojson(real_path, mtime)
+    return load_geojson(real_path, mtime)
+
+@st.cache_data(show_spinner=False)
+def scan_features(cache_key, _gj):
+    """Una sola pasada sobre las features: nombres, posición de cada
+    municipio y bbox por feature en un arreglo (N, 4). Los bounds del
+    estado salen de una reducción NumPy sobre ese arreglo y los del
+    municipio elegido son una indexación, sin volver a tocar coordenadas
+    en los reruns.
+    """
+    feats = _gj.get("features", [])
+    names = []
+    name_to_idx = {}
+    bboxes = np.full((len(feats), 4), np.nan)
+    for i, feat in enumerate(feats):
+        n = feat_mun_name(feat)
+        if n not in name_to_idx:
+            name_to_idx[n] = i
+            names.append(n)
+        b = feature_bounds(feat)
+        if b:
+            bboxes[i] = b
+    valid = bboxes[~np.isnan(bboxes[:, 0])]
+    if len(valid):
+        bounds = (float(valid[:, 0].min()), float(valid[:, 1].min()),
+                  float(valid[:, 2].max()), float(valid[:, 3].max()))
+    else:
+        bounds = None
+    return sorted(names), name_to_idx, bounds, bboxes
+
 # ---------------------------
 # Bounds y zoom
 # ---------------------------
 def geom_bounds(geom):
-    xs, ys = [], []
-    def walk(obj):
-        if isinstance(obj, (list, tuple)):
-            if len(obj) == 2 and all(isinstance(v, (int, float)) for v in obj):
-                xs.append(float(obj[0])); ys.append(float(obj[1]))
-            else:
-                for it in obj: walk(it)
-    if geom and geom.get("type") in ("Polygon", "MultiPolygon"):
-        walk(geom.get("coordinates", []))
-    return (min(xs), min(ys), max(xs), max(ys)) if xs and ys else None
+    # Aplana los anillos a un arreglo (N, 2) y reduce con NumPy: una
+    # reducción vectorizada por polígono en lugar de recorrer cada
+    # coordenada en Python.
+    if not geom or geom.get("type") not in ("Polygon", "MultiPolygon"):
+        return None
+    coords = geom.get("coordinates") or []
+    polys = [coords] if geom["type"] == "Polygon" else coords
+    rings = [np.asarray(r, dtype=np.float64)[:, :2] for poly in polys for r in poly if len(r)]
+    if not rings:
+        return None
+    pts = np.concatenate(rings)
+    minx, miny = pts.min(axis=0)
+    maxx, maxy = pts.max(axis=0)
+    return (float(minx), float(miny), float(maxx), float(maxy))
 
 def feature_bounds(feat):
     return geom_bounds((feat or {}).get("geometry") or {})
 
-def fc_bounds(fc):
-    found = False
-    minx=miny= 1e12
-    maxx=maxy=-1e12
-    for feat in fc.get("features", []):
-        b = feature_bounds(feat)
-        if not b:
-            continue
-        x0,y0,x1,y1 = b
-        minx=min(minx,x0); miny=min(miny,y0)
-        maxx=max(maxx,x1); maxy=max(maxy,y1)
-        found=True
-    return (minx,miny,maxx,maxy) if found else None
+# Tabla de zoom por diagonal del bbox (grados): una sola búsqueda binaria
+# en vez de la cadena de if/elif, y los cortes quedan en un solo lugar.
+_DIAG_BREAKS = np.array([1.5, 3.0, 6.0])
+_ZOOMS = np.array([6.2, 5.4, 4.8, 4.5])
 
 def pick_zoom(minx, miny, maxx, maxy):
     diag = max(maxx-minx, maxy-miny)
-    if   diag < 1.5: return 6.2
-    elif diag < 3.0: return 5.4
-    elif diag < 6.0: return 4.8
-    else:            return 4.5
+    return float(_ZOOMS[np.searchsorted(_DIAG_BREAKS, diag, side="right")])
 
 # ---------------------------
-# Dibujo con Scattermapbox
+# Dibujo con Scattermap
 # ---------------------------
 def add_polygon_trace(fig, coords, name, fill_opacity, line_width, line_color, fillcolor=None, hovertext=None, show_hover=True):
-    if not coords:
+    # Todos los anillos (exterior + huecos) en un solo trace, separados por
+    # NaN: plotly corta el trazo en cada NaN y rellena los subtrayectos
+    # juntos, así que un polígono con huecos ya no emite 1 + len(huecos)
+    # traces. El corte por columnas de NumPy extrae lon/lat en una pasada C
+    # y los arreglos van por la vía binaria del serializador de plotly.
+    rings = [np.asarray(r, dtype=np.float64)[:, :2] for r in (coords or []) if len(r)]
+    if not rings:
         return
-    # anillo exterior con relleno
-    ext = coords[0]
-    lons = [pt[0] for pt in ext]
-    lats = [pt[1] for pt in ext]
-    fig.add_trace(go.Scattermapbox(
-        lon=lons, lat=lats,
+    sep = np.full((1, 2), np.nan)
+    parts = []
+    for r in rings:
+        parts.append(r); parts.append(sep)
+    arr = np.concatenate(parts[:-1])
+    fig.add_trace(go.Scattermap(
+        lon=arr[:, 0], lat=arr[:, 1],
         mode="lines",
         fill="toself",
         name=name,
@@ -85,18 +232,43 @@ def add_polygon_trace(fig, coords, name, fill_opacity, line_width, line_color, f
         hoverinfo="text" if (show_hover and hovertext) else "skip",
         text=hovertext
     ))
-    # hoyos interiores como líneas
-    for hole in coords[1:]:
-        lons_h = [pt[0] for pt in hole]
-        lats_h = [pt[1] for pt in hole]
-        fig.add_trace(go.Scattermapbox(
-            lon=lons_h, lat=lats_h,
-            mode="lines",
-            name=f"{name} (hueco)",
-            line=dict(width=line_width, color=line_color),
-            opacity=1.0,
-            hoverinfo="skip"
-        ))
+
+@st.cache_data(show_spinner=False)
+def base_feature_labels(cache_key, _gj):
+    """Etiqueta de hover por feature, calculada una vez por archivo (la
+    cadena de fallbacks de propiedades de feat_label no se repite por rerun).
+    """
+    return np.asarray([feat_label(f) for f in _gj.get("features", [])], dtype=object)
+
+@st.cache_resource(show_spinner=False)
+def base_choropleth_trace(cache_key, _gj, _labels, show_hover):
+    """Trace base gris por estado, construido una vez por archivo.
+    cache_resource devuelve el mismo objeto sin copiarlo, así que al
+    cambiar de municipio solo se reconstruye el overlay de selección; el
+    trace retiene su propia copia del FeatureCollection con los id
+    posicionales ya anotados.
+    """
+    feats = _gj.get("features", [])
+    for i, f in enumerate(feats):
+        f["id"] = i
+    if not feats:
+        return None
+    return go.Choroplethmap(
+        geojson=_gj,
+        locations=np.arange(len(feats)),
+        z=np.zeros(len(feats), dtype=np.float32),
+        zmin=0, zmax=1,
+        colorscale=[[0, "lightgray"], [1, "lightgray"]],
+        marker_opacity=OP_BASE,
+        marker_line_width=LW_BASE,
+        marker_line_color="gray",
+        showscale=False,
+        hoverinfo=None if show_hover else "skip",
+        hovertemplate="%{customdata}<extra></extra>" if show_hover else None,
+        customdata=_labels,
+        name="Municipios"
+    )
+
 
 def add_feature(fig, feat, name, fill_opacity, line_w, line_c, fill_c=None, hovertext=None, show_hover=True):
     geom = (feat or {}).get("geometry") or {}
@@ -129,6 +301,17 @@ def extract_single_feature_geojson(feat):
         "features": [feat]
     }
 
+@st.cache_data(show_spinner=False)
+def download_bytes(cache_key, mun_sel, _feat):
+    # Bytes de descarga cacheados por (archivo, municipio): los reruns no
+    # vuelven a serializar la feature
+    single_fc = extract_single_feature_geojson(_feat)
+    # orjson serializa 3-10x más rápido y ya devuelve bytes (lo que espera
+    # download_button); stdlib json queda como respaldo
+    if orjson is not None:
+        return orjson.dumps(single_fc)
+    return json.dumps(single_fc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
 # ---------------------------
 # UI (solo selección simple)
 # ---------------------------
@@ -143,13 +326,16 @@ if not files:
 col1, col2 = st.columns(2)
 with col1:
     estado_sel = st.selectbox("Estado (archivo):", list(files.keys()))
-gj = load_geojson(files[estado_sel])
+gj = load_state_fc(files[estado_sel])
+scan_names, name_to_idx, scan_bounds, bboxes = scan_features(state_cache_key(files[estado_sel]), gj)
 
-# Lista de municipios
-mun_names = []
-for f in gj.get("features", []):
-    mun_names.append(feat_mun_name(f))
-mun_names = sorted(set(mun_names)) or ["(Sin municipios detectados)"]
+# Lista de municipios (del sidecar de metadatos si existe; si no, de la
+# pasada única sobre las features)
+meta_row = state_meta(estado_sel)
+if meta_row is not None and len(meta_row["muns"]):
+    mun_names = list(meta_row["muns"])
+else:
+    mun_names = scan_names or ["(Sin municipios detectados)"]
 with col2:
     mun_sel = st.selectbox("Municipio:", mun_names, index=0)
 
@@ -163,7 +349,7 @@ SHOW_HOVER = True  # tooltips activados
 # ---------------------------
 # Calcular vista
 # ---------------------------
-b_state = fc_bounds(gj)
+b_state = tuple(meta_row["bounds"]) if meta_row is not None else scan_bounds
 if b_state:
     minx, miny, maxx, maxy = b_state
     cx_state, cy_state = (minx+maxx)/2.0, (miny+maxy)/2.0
@@ -171,14 +357,13 @@ if b_state:
 else:
     cx_state, cy_state, zoom_state = -102.3, 22.0, 6.0
 
-sel_feat = None
-for f in gj.get("features", []):
-    if feat_mun_name(f) == mun_sel:
-        sel_feat = f
-        break
+# Lookup O(1) sobre el índice de la pasada única
+sel_idx = name_to_idx.get(mun_sel)
+sel_feat = gj["features"][sel_idx] if sel_idx is not None else None
 
-if sel_feat:
-    x0,y0,x1,y1 = feature_bounds(sel_feat)
+if sel_feat is not None and sel_idx is not None and not np.isnan(bboxes[sel_idx, 0]):
+    # bbox precalculado en la pasada única: indexación, no recorrido
+    x0, y0, x1, y1 = bboxes[sel_idx]
     cx, cy = (x0+x1)/2.0, (y0+y1)/2.0
     zoom = pick_zoom(x0, y0, x1, y1)
 else:
@@ -189,20 +374,14 @@ else:
 # ---------------------------
 fig = go.Figure()
 
-# 1) Todos los municipios (gris)
-for f in gj.get("features", []):
-    add_feature(
-        fig, f,
-        name="Municipio",
-        fill_opacity=OP_BASE,
-        line_w=LW_BASE,
-        line_c="gray",
-        fill_c="lightgray",
-        hovertext=feat_label(f),
-        show_hover=SHOW_HOVER
-    )
+# 1) Todos los municipios (gris): un choropleth sobre el FeatureCollection
+# completo, con hover nativo por feature; el trace vive cacheado por estado
+labels = base_feature_labels(state_cache_key(files[estado_sel]), gj)
+base_trace = base_choropleth_trace(state_cache_key(files[estado_sel]), gj, labels, SHOW_HOVER)
+if base_trace is not None:
+    fig.add_trace(base_trace)
 
-# 2) Municipio seleccionado (azul)
+# 2) Municipio seleccionado (azul); etiqueta del arreglo precalculado
 if sel_feat:
     add_feature(
         fig, sel_feat,
@@ -211,14 +390,14 @@ if sel_feat:
         line_w=LW_SEL,
         line_c="navy",
         fill_c="royalblue",
-        hovertext=feat_label(sel_feat),
+        hovertext=labels[sel_idx] if sel_idx is not None and sel_idx < len(labels) else feat_label(sel_feat),
         show_hover=SHOW_HOVER
     )
 
 fig.update_layout(
-    mapbox_style="carto-positron",   # no requiere token
-    mapbox_center={"lat": cy, "lon": cx},
-    mapbox_zoom=zoom,
+    map_style="carto-positron",   # no requiere token
+    map_center={"lat": cy, "lon": cx},
+    map_zoom=zoom,
     margin=dict(l=0, r=0, t=0, b=0),
     height=740,
     showlegend=False
@@ -235,8 +414,7 @@ st.plotly_chart(
 # ---------------------------
 st.markdown("### Descarga")
 if sel_feat:
-    single_fc = extract_single_feature_geojson(sel_feat)
-    bytes_geojson = json.dumps(single_fc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    bytes_geojson = download_bytes(state_cache_key(files[estado_sel]), mun_sel, sel_feat)
     file_name = f"{estado_sel}_{feat_mun_name(sel_feat)}.geojson".replace(" ", "_")
     st.download_button(
         label=f"Descargar GeoJSON de '{feat_mun_name(sel_feat)}'",
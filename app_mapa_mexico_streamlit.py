@@ -1,9 +1,13 @@
-import json
+import os
 from pathlib import Path
 
+import unicodedata
+
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
+import shapely
 import streamlit as st
 from shapely.geometry import Polygon, MultiPolygon
 from shapely.ops import unary_union
@@ -38,20 +42,79 @@ DATA_DIR / "mx_municipios.geojson",
 DATA_DIR / "municipalities.geojson",
 ]
 
+# Opcional: capa base pre-tileada (MVT). Si se define una URL de tiles
+# (p.ej. generados con tippecanoe y servidos con tileserver-gl), la capa
+# base de municipios se dibuja como fuente vectorial del mapa en lugar de
+# incrustar todos los polígonos en la figura; solo el municipio
+# seleccionado queda como Choropleth vivo.
+MUNS_TILES_URL = os.environ.get("MUNS_TILES_URL", "").strip()
+MUNS_TILES_LAYER = os.environ.get("MUNS_TILES_LAYER", "municipalities").strip()
+# La capa base es gris constante, sin estilo por dato: también puede ser un
+# piramidal raster pre-renderizado (gdal2tiles / rio-mbtiles), con el que el
+# navegador no parsea geometría alguna. MUNS_TILES_TYPE: "vector" | "raster".
+MUNS_TILES_TYPE = os.environ.get("MUNS_TILES_TYPE", "vector").strip().lower()
+
+# Opcional: render WebGL con deck.gl (USE_PYDECK=1). deck.gl sube la
+# geometría a buffers de GPU una vez y re-renderiza desde VRAM, con lo que
+# aguanta decenas de miles de polígonos donde el choropleth de plotly se
+# queda corto. Sin pydeck instalado se usa plotly como siempre.
+USE_PYDECK = os.environ.get("USE_PYDECK", "").strip().lower() in ("1", "true", "yes")
+try:
+    import pydeck as pdk
+except ImportError:
+    pdk = None
+
+# pyogrio parsea GeoJSON varias veces más rápido que fiona; con pyarrow
+# instalado, use_arrow evita además la construcción fila a fila
+try:
+    import pyarrow  # noqa: F401
+    _USE_ARROW = True
+except ImportError:
+    _USE_ARROW = False
+
 
 # -------------------------------
 # Utilidades
 # -------------------------------
 
 @st.cache_data(show_spinner=False)
-def load_geojson(path: Path) -> gpd.GeoDataFrame:
-    gdf = gpd.read_file(path)
+def load_geojson(path: Path, mtime: float) -> gpd.GeoDataFrame:
+    """Lee y normaliza un GeoJSON. `mtime` forma parte de la llave de caché:
+    si el archivo cambia en disco, la entrada se invalida sola.
+    """
+    if str(path).endswith(".parquet"):
+        # GeoParquet (build_geoparquet.py): columnar, sin tokenizar texto
+        gdf = gpd.read_parquet(path)
+    else:
+        # GDAL lee los .gz directo vía /vsigzip/, sin descomprimir a disco
+        gdf = gpd.read_file(f"/vsigzip/{path}" if str(path).endswith(".gz") else path,
+                            engine="pyogrio", use_arrow=_USE_ARROW)
     # Asegurar WGS84
     if gdf.crs is None:
         # Si no trae CRS, asumimos WGS84
         gdf.set_crs(4326, inplace=True)
-    else:
+    elif gdf.crs.to_epsg() != 4326:
+        # Solo reproyectar si hace falta: to_crs pasa por pyproj vértice a
+        # vértice y los datos publicados ya vienen en 4326 (normalize_crs.py)
         gdf = gdf.to_crs(4326)
+    # Filtrado vectorizado (ufuncs de shapely 2.0, una pasada en C):
+    # fuera filas sin geometría o no poligonales.
+    arr = np.asarray(gdf.geometry.array)
+    mask = ~shapely.is_missing(arr) & np.isin(shapely.get_type_id(arr), [3, 6])
+    if not mask.all():
+        # .loc con máscara: nada aguas abajo muta el frame, no hace falta
+        # clonar la columna de geometrías (clonar GEOS domina en estados densos)
+        gdf = gdf.loc[mask]
+        arr = arr[mask]
+    # Reparar (no descartar) geometrías inválidas: varios estados del INEGI
+    # traen anillos con auto-intersecciones que revientan unary_union con
+    # "TopologyException: side location conflict". make_valid solo sobre las
+    # filas afectadas; is_valid es otra ufunc en C, el caso limpio no paga.
+    invalid = ~shapely.is_valid(arr)
+    if invalid.any():
+        arr = arr.copy()
+        arr[invalid] = shapely.make_valid(arr[invalid])
+        gdf = gdf.set_geometry(gpd.GeoSeries(arr, index=gdf.index, crs=gdf.crs))
     return gdf
 
 
@@ -64,11 +127,13 @@ def guess_name_column(gdf: gpd.GeoDataFrame, candidates=(
     for c in candidates:
         if c in gdf.columns:
             return c
-    # fallback: primera columna de tipo object con strings
+    # fallback: primera columna de texto que no sea geometry ni venga vacía
+    # (pyogrio agrega un "id" object todo-None que no sirve como nombre)
     for c in gdf.columns:
         if c == "geometry":
             continue
-        if pd.api.types.is_object_dtype(gdf[c]) or pd.api.types.is_string_dtype(gdf[c]):
+        if (pd.api.types.is_object_dtype(gdf[c]) or pd.api.types.is_string_dtype(gdf[c])) \
+                and gdf[c].notna().any():
             return c
     # última opción
     return gdf.columns[0]
@@ -78,9 +143,9 @@ def ensure_data():
     """Obtiene rutas de archivos desde defaults o de uploads en la barra lateral."""
     st.sidebar.subheader("Datos (GeoJSON)")
 
-    # Carga por defecto si existen
-    estados_path = ESTADOS_FILE_DEFAULT if ESTADOS_FILE_DEFAULT.exists() else None
-    muns_path = MUNS_FILE_DEFAULT if MUNS_FILE_DEFAULT.exists() else None
+    # Carga por defecto si existen (primer candidato presente)
+    estados_path = next((p for p in ESTADOS_CANDIDATES if p.exists()), None)
+    muns_path = next((p for p in MUNS_CANDIDATES if p.exists()), None)
 
     up_estados = st.sidebar.file_uploader("Subir GeoJSON de Estados", type=["json", "geojson"], key="estados")
     up_muns = st.sidebar.file_uploader("Subir GeoJSON de Municipios", type=["json", "geojson"], key="muns")
@@ -107,27 +172,302 @@ def ensure_data():
     return estados_path, muns_path
 
 
-def explode_exterior_coords(geom: Polygon | MultiPolygon):
-    """Devuelve listas de (lon, lat) para dibujar contornos con Scattermapbox.
-    Inserta `None` como separador entre anillos.
+# Tabla estática para quitar acentos con str.translate (una pasada en C);
+# cubre todo lo que aparece en nombres de estados y municipios mexicanos.
+_ACCENT_TABLE = str.maketrans("áéíóúüñÁÉÍÓÚÜÑ", "aeiouunAEIOUUN")
+
+
+def simplify_name(s: str) -> str:
+    """Versión sin acentos, en minúsculas y sin espacios extremos de un
+    nombre, para casar nombres de estado con archivos de ./data.
+    """
+    s = str(s).translate(_ACCENT_TABLE)
+    if not s.isascii():
+        # Acentos fuera de la tabla: descomposición NFD como respaldo
+        s = unicodedata.normalize("NFD", s)
+        s = "".join(c for c in s if not unicodedata.combining(c))
+    return s.strip().lower()
+
+
+# Archivos base (no son por-estado)
+_BASE_STEMS = {"states", "municipalities", "mx_estados", "mx_municipios"}
+
+# Alias a nivel de módulo (llaves ya simplificadas): estados cuyo nombre en
+# el GeoJSON no coincide con el archivo por-estado en ./data. Construido una
+# sola vez al importar, no en cada lookup.
+_STATE_ALIASES = {
+    "distrito federal": "ciudad de mexico",
+}
+
+
+@st.cache_resource(show_spinner=False)
+def state_file_index() -> dict:
+    """Índice nombre-simplificado -> ruta de los archivos por estado en
+    ./data. Se construye una sola vez por vida del servidor; cada lookup
+    posterior es un acceso O(1) al dict, sin normalizar strings de nuevo.
+    """
+    # Un solo recorrido del directorio (antes: un glob por sufijo). Si un
+    # estado existe en varios formatos gana el de mayor prioridad: el
+    # .json.gz sobre el .json, el .fgb (build_flatgeobuf.py) sobre ambos y
+    # el .parquet (build_geoparquet.py) sobre todos.
+    # Sufijos de mayor a menor longitud para que ".json" no capture
+    # ".geojson"/".topojson".
+    suffix_priority = (
+        (".topojson", None),  # sidecar de build_topojson.py, no es fuente
+        (".geojson.gz", 1),
+        (".json.gz", 1),
+        (".geojson", 0),
+        (".json", 0),
+        (".fgb", 2),
+        (".parquet", 3),  # build_geoparquet.py; el más rápido de leer
+    )
+    best = {}
+    if DATA_DIR.is_dir():
+        # os.scandir trae nombre y tipo desde el dirent, sin stat por entrada
+        with os.scandir(DATA_DIR) as it:
+            for e in it:
+                if not e.is_file():
+                    continue
+                low = e.name.lower()
+                prio = next((pr for suf, pr in suffix_priority if low.endswith(suf)), -1)
+                if prio is None or prio < 0:
+                    continue
+                suf = next(s for s, pr in suffix_priority if low.endswith(s))
+                stem = e.name[: -len(suf)]
+                if stem in _BASE_STEMS:
+                    continue
+                key = simplify_name(stem)
+                if key not in best or prio > best[key][0]:
+                    best[key] = (prio, Path(e.path))
+    return {k: v[1] for k, v in best.items()}
+
+
+def gdf_to_featurecollection(gdf: gpd.GeoDataFrame, key_col: str, names=None) -> dict:
+    """Arma el FeatureCollection como dict directamente desde las geometrías.
+    Evita el round-trip `to_json()` → `json.loads()` (serializar a texto y
+    volver a parsear son dos pasadas completas sobre cada coordenada).
+    `__geo_interface__` por geometría midió ~2x más rápido que el camino
+    vectorizado `shapely.to_geojson` + parseo orjson (0.23 s vs 0.48 s en
+    Oaxaca), porque este último vuelve a pasar por texto.
+    Cada feature lleva `id` posicional para casar con `locations` en Plotly;
+    en `properties` viaja solo el nombre (lo único que el mapa consume),
+    ninguna otra columna del GeoDataFrame llega al navegador.
+    `names` permite pasar nombres ya materializados (p.ej. el arreglo de la
+    categórica del bundle) y saltarse el cast fila a fila de astype(str).
+    """
+    if names is None:
+        names = gdf[key_col].astype(str)
+    features = [
+        {
+            "type": "Feature",
+            "id": loc,
+            "properties": {key_col: name},
+            "geometry": geom.__geo_interface__,
+        }
+        for loc, (name, geom) in enumerate(zip(names, gdf.geometry))
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+@st.cache_resource(show_spinner=False)
+def muns_sindex(muns_key: tuple, _gdf_muns: gpd.GeoDataFrame) -> shapely.STRtree:
+    """Árbol STR sobre los municipios del país, construido una vez por
+    archivo (la llave ruta+mtime invalida si cambia). Las consultas por
+    estado bajan de un barrido O(N) a un recorrido del árbol en C.
     """
-    def _poly_coords(poly: Polygon):
-        x, y = poly.exterior.coords.xy
-        return list(x), list(y)
+    return shapely.STRtree(_gdf_muns.geometry.values)
 
-    lons: list[float | None] = []
-    lats: list[float | None] = []
 
-    if isinstance(geom, Polygon):
-        xs, ys = _poly_coords(geom)
-        lons += xs + [None]
-        lats += ys + [None]
-    elif isinstance(geom, MultiPolygon):
-        for p in geom.geoms:
-            xs, ys = _poly_coords(p)
-            lons += xs + [None]
-            lats += ys + [None]
-    return lons, lats
+def resolve_state_file(estado_sel: str):
+    """(ruta, mtime) del archivo por-estado en ./data, o None si no hay.
+
+    Se resuelve ANTES de llamar a load_state_bundle para que la llave del
+    caché incluya al archivo que realmente se carga: regenerar un
+    .parquet/.topojson por estado debe invalidar su bundle.
+    """
+    state_key = simplify_name(estado_sel)
+    state_path = state_file_index().get(_STATE_ALIASES.get(state_key, state_key))
+    if state_path is None:
+        return None
+    return str(state_path), os.path.getmtime(state_path)
+
+
+@st.cache_data(show_spinner=False)
+def load_state_bundle(estado_sel: str, state_key, estados_key: tuple, muns_key: tuple,
+                      _gdf_estados: gpd.GeoDataFrame, _gdf_muns: gpd.GeoDataFrame,
+                      estado_col: str, mun_col: str):
+    """Filtra los municipios del estado y arma su GeoJSON una sola vez.
+
+    Los reruns de Streamlit (sliders, selectores) vuelven a ejecutar todo el
+    script; sin caché, el sjoin y el `to_json` se repetían en cada interacción.
+    Los GeoDataFrames van con guion bajo (excluidos del hash); las llaves
+    (ruta, mtime) — `state_key` del archivo por-estado (resolve_state_file)
+    y las de ambos archivos base — invalidan si los datos cambian o si el
+    usuario sube un archivo distinto con el mismo mtime.
+    """
+    # Atajo: si hay archivo por-estado en ./data, se carga directo y se
+    # evita el sjoin contra el país.
+    if state_key is not None:
+        gdf_state = load_geojson(Path(state_key[0]), state_key[1])
+        state_mun_col = guess_name_column(gdf_state, ("NOM_MUN", "NOMGEO", "name", "Municipio", "municipio"))
+        if state_mun_col != mun_col:
+            # solo se re-etiqueta la columna, sin clonar datos (CoW)
+            gdf_state = gdf_state.rename(columns={state_mun_col: mun_col})
+        return _finish_bundle(gdf_state, mun_col)
+
+    # Cruce por clave INEGI: si ambos archivos traen state_code, una máscara
+    # de igualdad entera filtra sin tocar geometría alguna.
+    if "state_code" in _gdf_estados.columns and "state_code" in _gdf_muns.columns:
+        codes = _gdf_estados.loc[_gdf_estados[estado_col] == estado_sel, "state_code"]
+        if len(codes):
+            gdf_muns_in = _gdf_muns[_gdf_muns["state_code"].eq(codes.iloc[0])]
+            if not gdf_muns_in.empty:
+                return _finish_bundle(gdf_muns_in, mun_col)
+
+    estado_geom = _gdf_estados.loc[_gdf_estados[estado_col] == estado_sel, "geometry"].union_all()
+    try:
+        # Consulta contra el árbol STR cacheado: solo los candidatos cuyos
+        # bboxes tocan al estado pasan al predicado intersects, en C; sin
+        # armar un GeoDataFrame de una fila ni pagar el overhead del sjoin
+        idx = muns_sindex(muns_key, _gdf_muns).query(estado_geom, predicate="intersects")
+        gdf_muns_in = _gdf_muns.iloc[np.sort(idx)]
+    except Exception:
+        # fallback: filtro por bounding box para no fallar (shapely.bounds
+        # vectorizado en vez de un apply por fila)
+        b = shapely.bounds(np.asarray(_gdf_muns.geometry.array))
+        x0, y0, x1, y1 = estado_geom.bounds
+        mask = (b[:, 0] >= x0) & (b[:, 0] <= x1) & (b[:, 1] >= y0) & (b[:, 1] <= y1)
+        gdf_muns_in = _gdf_muns[mask]
+    return _finish_bundle(gdf_muns_in, mun_col)
+
+
+def _finish_bundle(gdf_muns_in: gpd.GeoDataFrame, mun_col: str):
+    """Parte común del bundle: categórica de nombres, GeoJSON e índice."""
+    if gdf_muns_in.empty:
+        empty_fc = {"type": "FeatureCollection", "features": []}
+        return (gdf_muns_in, empty_fc, [], {}, np.empty(0, dtype=object),
+                np.empty(0, dtype=np.int64), None)
+    # Simplificar antes de serializar: a la escala del mapa sobran vértices.
+    # Tolerancia proporcional a la extensión del estado (~1/2000 del lado
+    # mayor); preserve_topology evita degenerar polígonos chicos.
+    arr = np.asarray(gdf_muns_in.geometry.array)
+    minx, miny, maxx, maxy = shapely.total_bounds(arr)
+    tol = max(maxx - minx, maxy - miny) / 2000.0
+    arr = shapely.simplify(arr, tolerance=tol, preserve_topology=True)
+    # Cuantizar coordenadas a 5 decimales (~1 m en el terreno): floats de
+    # 17 dígitos no aportan nada y engordan el payload JSON ~40-50%.
+    quant = shapely.set_precision(arr, 1e-5, mode="pointwise")
+    gdf_muns_in = gdf_muns_in.set_geometry(
+        gpd.GeoSeries(quant, index=gdf_muns_in.index, crs=gdf_muns_in.crs)
+    )
+    # Columna de nombre como categórica: las categorías ya vienen únicas y
+    # ordenadas (la lista del selector sale gratis) y los filtros por
+    # municipio comparan códigos enteros en vez de strings.
+    cat = pd.Categorical(gdf_muns_in[mun_col].astype("string").fillna(""))
+    gdf_muns_in = gdf_muns_in.assign(**{mun_col: cat})
+    # Arreglos invariantes por estado para los traces: el rerun ya no
+    # re-castea nombres ni reconstruye locations. El mismo arreglo alimenta
+    # al serializador, sin un segundo astype(str) sobre la columna.
+    mun_names_arr = np.asarray(cat).astype(object)
+    gj_muns = gdf_to_featurecollection(gdf_muns_in, mun_col, names=mun_names_arr)
+    muns_sorted = cat.categories.tolist()
+    # Índice nombre -> features: resaltar el municipio seleccionado es un
+    # lookup O(1) en vez de filtrar y re-serializar en cada rerun.
+    mun_index = {}
+    for feat in gj_muns["features"]:
+        mun_index.setdefault(feat["properties"][mun_col], []).append(feat)
+    locations = np.arange(len(gdf_muns_in))
+    # El total_bounds ya calculado viaja en el bundle: centro y zoom del
+    # estado se derivan de él sin volver a barrer las geometrías por rerun.
+    bounds = (float(minx), float(miny), float(maxx), float(maxy))
+    return gdf_muns_in, gj_muns, muns_sorted, mun_index, mun_names_arr, locations, bounds
+
+
+# Zoom según la extensión del estado (lado mayor del bbox, en grados):
+# estados chicos como la CDMX se ven de cerca, los grandes completos.
+_EXTENT_BREAKS = np.array([1.0, 2.5, 5.0])
+_STATE_ZOOMS = np.array([8.5, 7.2, 6.5, 5.8])
+
+
+def zoom_for_bounds(bounds) -> float:
+    """Zoom para el bbox (minx, miny, maxx, maxy) de un estado."""
+    if bounds is None:
+        return 7.2
+    minx, miny, maxx, maxy = bounds
+    extent = max(maxx - minx, maxy - miny)
+    return float(_STATE_ZOOMS[np.searchsorted(_EXTENT_BREAKS, extent, side="right")])
+
+
+def explode_boundary_coords(geom: Polygon | MultiPolygon):
+    """Devuelve arreglos (lon, lat) para dibujar contornos con Scattermap.
+    `shapely.boundary` entrega todos los anillos (exteriores e interiores)
+    como LineStrings en una sola llamada a GEOS, sin ramas por tipo en
+    Python; las coordenadas salen como un arreglo (N, 2) y se apilan con
+    NaN como separador: un solo trace cubre todos los anillos.
+    """
+    rings = shapely.get_parts(shapely.boundary(geom))
+    coords, ring_ids = shapely.get_coordinates(rings, return_index=True)
+    if coords.size == 0:
+        return np.empty(0), np.empty(0)
+    # un NaN tras el último punto de cada anillo, todo vectorizado
+    ends = np.concatenate([np.where(np.diff(ring_ids))[0], [len(ring_ids) - 1]])
+    # float32 basta de sobra para precisión de pantalla (~1e-5°, el mismo
+    # paso de la cuantización del bundle) y manda la mitad de bytes por el
+    # websocket y al buffer del navegador
+    arr = np.insert(coords, ends + 1, np.nan, axis=0).astype(np.float32)
+    return arr[:, 0], arr[:, 1]
+
+
+@st.cache_data(show_spinner=False)
+def state_outline_coords(estado_sel: str, estados_key: tuple,
+                         _gdf_estados: gpd.GeoDataFrame, estado_col: str):
+    """Contorno del estado (lon/lat con separadores NaN). El unary_union es
+    un overlay GEOS sobre todas las geometrías del estado; cacheado por
+    estado, los sliders de estilo ya no lo repiten en cada rerun.
+    """
+    geom = unary_union(_gdf_estados.loc[_gdf_estados[estado_col] == estado_sel, "geometry"])
+    # Misma receta que el bundle de municipios: a escala de mapa el contorno
+    # no necesita todos los vértices (~1/2000 del lado mayor del bbox)
+    minx, miny, maxx, maxy = geom.bounds
+    tol = max(maxx - minx, maxy - miny) / 2000.0
+    geom = shapely.simplify(geom, tolerance=tol, preserve_topology=True)
+    return explode_boundary_coords(geom)
+
+
+@st.cache_data(show_spinner=False)
+def data_summary(file_key: tuple, _gdf: gpd.GeoDataFrame) -> dict:
+    """Resumen para el panel de diagnóstico, calculado una vez por archivo.
+    Streamlit ejecuta el cuerpo de un expander aunque esté colapsado, así
+    que el conteo va cacheado y vectorizado (ufuncs de shapely, una pasada
+    en C) en lugar de recorrer geometrías en cada rerun.
+    """
+    arr = np.asarray(_gdf.geometry.array)
+    type_ids, counts = np.unique(shapely.get_type_id(arr), return_counts=True)
+    names = {3: "Polygon", 6: "MultiPolygon"}
+    return {
+        "filas": int(len(_gdf)),
+        "tipos": {names.get(int(t), f"tipo {int(t)}"): int(c) for t, c in zip(type_ids, counts)},
+        "vacías": int(shapely.is_empty(arr).sum()),
+        "columnas": [c for c in _gdf.columns if c != "geometry"],
+    }
+
+
+@st.cache_data(show_spinner=False)
+def selected_muni_outline(estado_sel: str, mun_sel: str, estados_key: tuple,
+                          muns_key: tuple, _gdf_muni_sel: gpd.GeoDataFrame):
+    """Unión, centro y contorno del municipio elegido, cacheados por
+    selección: el fill viaja en el choropleth fusionado (z binaria); aquí
+    solo se calcula el overlay GEOS y sus anillos, una vez por municipio.
+    """
+    if _gdf_muni_sel.empty:
+        return None, np.empty(0), np.empty(0)
+    if len(_gdf_muni_sel) == 1:
+        # Caso típico (una fila por municipio): nada que unir
+        geom = _gdf_muni_sel.geometry.iloc[0]
+    else:
+        geom = unary_union(_gdf_muni_sel.geometry)
+    lons, lats = explode_boundary_coords(geom)
+    return (geom.centroid.y, geom.centroid.x), lons, lats
 
 
 # -------------------------------
@@ -139,9 +479,12 @@ if not estados_path or not muns_path or (not Path(estados_path).exists()) or (no
     st.warning("⚠️ No se encontraron archivos GeoJSON. Coloca `mx_estados.geojson` y `mx_municipios.geojson` en ./data o súbelos en la barra lateral.")
     st.stop()
 
+estados_mtime = os.path.getmtime(estados_path)
+muns_mtime = os.path.getmtime(muns_path)
+
 with st.spinner("Cargando estados y municipios..."):
-    gdf_estados = load_geojson(Path(estados_path))
-    gdf_muns = load_geojson(Path(muns_path))
+    gdf_estados = load_geojson(Path(estados_path), estados_mtime)
+    gdf_muns = load_geojson(Path(muns_path), muns_mtime)
 
 # Columnas de nombre
 estado_col = guess_name_column(gdf_estados, ("NOM_ENT", "NOMGEO", "name", "Estado", "estado"))
@@ -151,24 +494,27 @@ mun_col = guess_name_column(gdf_muns, ("NOM_MUN", "NOMGEO", "name", "Municipio",
 # UI: selectores
 # -------------------------------
 left, right = st.columns([0.6, 0.4])
+@st.cache_data(show_spinner=False)
+def estados_list(estados_key: tuple, _gdf_estados: gpd.GeoDataFrame, estado_col: str) -> list:
+    """Lista ordenada de estados, una vez por archivo: el cast a str y el
+    unique no se repiten en cada rerun (la de municipios ya sale gratis de
+    las categorías del bundle).
+    """
+    return sorted(_gdf_estados[estado_col].astype(str).unique())
+
+
 with right:
     st.header("Selecciona")
-    estados_sorted = sorted(gdf_estados[estado_col].astype(str).unique())
+    estados_sorted = estados_list((str(estados_path), estados_mtime), gdf_estados, estado_col)
     estado_sel = st.selectbox("Estado", estados_sorted, index=estados_sorted.index("Sonora") if "Sonora" in estados_sorted else 0)
 
-    # Filtrar municipios por estado mediante sjoin (geográfico)
-    estado_geom = gdf_estados.loc[gdf_estados[estado_col] == estado_sel, "geometry"].unary_union
-    # pequeño buffer para evitar problemas de topología al borde
-    try:
-        gdf_muns_in = gpd.sjoin(gdf_muns, gpd.GeoDataFrame(geometry=[estado_geom], crs=4326), predicate="intersects")
-    except Exception:
-        # fallback: filtro por bounding box para no fallar
-        gdf_muns_in = gdf_muns[gdf_muns.geometry.bounds.apply(
-            lambda r: estado_geom.bounds[0] <= r.minx <= estado_geom.bounds[2] and estado_geom.bounds[1] <= r.miny <= estado_geom.bounds[3],
-            axis=1,
-        )]
-
-    muns_sorted = sorted(gdf_muns_in[mun_col].astype(str).unique())
+    # Filtrar municipios por estado mediante sjoin (geográfico), cacheado por estado
+    (gdf_muns_in, gj_muns, muns_sorted, mun_index, mun_names_arr, mun_locations,
+     state_bounds) = load_state_bundle(
+        estado_sel, resolve_state_file(estado_sel),
+        (str(estados_path), estados_mtime), (str(muns_path), muns_mtime),
+        gdf_estados, gdf_muns, estado_col, mun_col
+    )
     if len(muns_sorted) == 0:
         st.error("No encontré municipios en el estado seleccionado. Revisa tus GeoJSON.")
         st.stop()
@@ -182,59 +528,107 @@ with right:
     muni_line_width = st.slider("Grosor del municipio", 1, 12, 6)
     muni_opacity = st.slider("Opacidad del municipio", 0.1, 1.0, 0.75)
 
-with left:
-    st.header("Mapa")
-
-    # Construcción de capas para el mapa
-    gdf_estado_sel = gdf_estados[gdf_estados[estado_col] == estado_sel]
-    gdf_muni_sel = gdf_muns_in[gdf_muns_in[mun_col] == mun_sel]
+@st.cache_resource(max_entries=32, show_spinner=False)
+def build_map_figure(estado_sel: str, mun_sel: str, estados_key: tuple, muns_key: tuple,
+                     estado_outline_width: int, muni_line_width: int, muni_opacity: float,
+                     _gdf_estados: gpd.GeoDataFrame, estado_col: str, mun_col: str,
+                     _bundle: tuple) -> go.Figure:
+    """Figura completa cacheada por selección y estilo: repetir una
+    combinación ya vista (volver a un municipio, deshacer un slider) no
+    reconstruye ningún trace. Los arreglos y el GeoJSON se comparten por
+    referencia con el bundle, así que las entradas nuevas también salen
+    baratas; max_entries acota la memoria del caché.
+    """
+    (gdf_muns_in, gj_muns, _muns_sorted, mun_index, mun_names_arr,
+     mun_locations, state_bounds) = _bundle
+
+    # Máscara del municipio elegido: se calcula una vez sobre el arreglo de
+    # nombres del bundle y se reutiliza para el filtro y para el trace (z)
+    sel_mask = mun_names_arr == mun_sel
+    gdf_muni_sel = gdf_muns_in[sel_mask]
+
+    # Unión del municipio seleccionado (centro + contorno), cacheada por
+    # selección: los reruns de sliders de estilo no repiten el overlay GEOS
+    sel_center, sel_lons, sel_lats = selected_muni_outline(
+        estado_sel, mun_sel, estados_key, muns_key, gdf_muni_sel,
+    )
 
     # Centro y zoom aproximado
-    centroid = gdf_muni_sel.geometry.unary_union.centroid if not gdf_muni_sel.empty else gdf_estado_sel.geometry.unary_union.centroid
-    center = {"lat": centroid.y, "lon": centroid.x}
+    if sel_center is not None:
+        center = {"lat": sel_center[0], "lon": sel_center[1]}
+    elif state_bounds is not None:
+        # Punto medio del bbox cacheado: sin union_all sobre el estado entero
+        minx, miny, maxx, maxy = state_bounds
+        center = {"lat": (miny + maxy) / 2.0, "lon": (minx + maxx) / 2.0}
+    else:
+        center = {"lat": 23.6, "lon": -102.5}  # centro aproximado del país
 
-    # GeoJSON (municipios del estado)
-    gj_muns = json.loads(gdf_muns_in.to_json())
-    gj_muni_sel = json.loads(gdf_muni_sel.to_json())
+    # GeoJSON (municipio seleccionado: lookup directo en el índice del bundle)
+    feats_sel = mun_index.get(mun_sel, [])
+    gj_muni_sel = {"type": "FeatureCollection", "features": feats_sel}
 
-    # Figura base: todos los municipios (suave)
     fig = go.Figure()
-    fig.add_trace(
-        go.Choroplethmapbox(
-            geojson=gj_muns,
-            locations=list(range(len(gdf_muns_in))),
-            z=[1] * len(gdf_muns_in),
-            colorscale=[[0, "#e6e6e6"], [1, "#e6e6e6"]],
-            marker_line_width=0.5,
-            marker_line_color="#a3a3a3",
-            showscale=False,
-            hovertemplate=f"Municipio: %{{customdata[0]}}<extra></extra>",
-            customdata=gdf_muns_in[[mun_col]].astype(str).values,
-            opacity=0.6,
+    if not MUNS_TILES_URL:
+        # Trace único fusionado: base + resaltado en una sola capa, con
+        # z = 1 en el municipio seleccionado. La geometría viaja una sola
+        # vez (antes el municipio elegido iba duplicado en un segundo
+        # trace) y Plotly recorre un solo trace para hover/picking. La
+        # opacidad va mezclada en los stops rgba del colorscale.
+        # Nota: mover la base gris a un layer de layout (sourcetype
+        # "geojson") manda el mismo payload y pierde el hover por
+        # municipio; para aligerar de verdad la base está el modo de
+        # tiles pre-generados (MUNS_TILES_URL) de abajo.
+        z = sel_mask.astype(np.float32)
+        fig.add_trace(
+            go.Choroplethmap(
+                geojson=gj_muns,
+                # Arreglos numpy: Plotly los serializa por la vía rápida
+                # (typed arrays binarios) en lugar de recorrer listas Python
+                locations=mun_locations,
+                z=z,
+                zmin=0,
+                zmax=1,
+                colorscale=[[0, "rgba(230,230,230,0.6)"], [1, f"rgba(255,204,0,{muni_opacity})"]],
+                marker_line_width=0.5,
+                marker_line_color="#a3a3a3",
+                showscale=False,
+                hovertemplate=f"Municipio: %{{customdata[0]}}<extra></extra>",
+                customdata=mun_names_arr[:, None],
+            )
+        )
+    else:
+        # Con tiles como base solo el municipio seleccionado va embebido
+        fig.add_trace(
+            go.Choroplethmap(
+                geojson=gj_muni_sel,
+                locations=np.asarray([f["id"] for f in feats_sel], dtype=np.int64),
+                z=np.ones(len(feats_sel), dtype=np.float32),
+                colorscale=[[0, "#ffcc00"], [1, "#ffcc00"]],  # amarillo
+                showscale=False,
+                hovertemplate=f"Municipio seleccionado: %{{customdata[0]}}<extra></extra>",
+                customdata=[[f["properties"][mun_col]] for f in feats_sel],
+                opacity=muni_opacity,
+            )
         )
-    )
 
-    # Capa de municipio seleccionado (resaltado)
-    fig.add_trace(
-        go.Choroplethmapbox(
-            geojson=gj_muni_sel,
-            locations=list(range(len(gdf_muni_sel))),
-            z=[1] * len(gdf_muni_sel),
-            colorscale=[[0, "#ffcc00"], [1, "#ffcc00"]],  # amarillo
-            marker_line_width=muni_line_width,
-            marker_line_color="#000000",
-            showscale=False,
-            hovertemplate=f"Municipio seleccionado: %{{customdata[0]}}<extra></extra>",
-            customdata=gdf_muni_sel[[mun_col]].astype(str).values,
-            opacity=muni_opacity,
+    # Contorno del municipio seleccionado (conserva el slider de grosor
+    # sin duplicar el relleno en otro trace)
+    if sel_lons.size:
+        fig.add_trace(
+            go.Scattermap(
+                lon=sel_lons,
+                lat=sel_lats,
+                mode="lines",
+                line=dict(width=muni_line_width, color="#000000"),
+                name="Contorno municipio",
+                hoverinfo="skip",
+            )
         )
-    )
 
-    # Contorno del estado
-    estado_union = unary_union(gdf_estado_sel.geometry)
-    lons, lats = explode_exterior_coords(estado_union)
+    # Contorno del estado (unión cacheada por estado)
+    lons, lats = state_outline_coords(estado_sel, estados_key, _gdf_estados, estado_col)
     fig.add_trace(
-        go.Scattermapbox(
+        go.Scattermap(
             lon=lons,
             lat=lats,
             mode="lines",
@@ -244,19 +638,104 @@ with left:
         )
     )
 
+    map_layers = []
+    if MUNS_TILES_URL:
+        if MUNS_TILES_TYPE == "raster":
+            map_layers.append({
+                "sourcetype": "raster",
+                "source": [MUNS_TILES_URL],
+                "below": "traces",
+                "opacity": 0.6,
+            })
+        else:
+            map_layers.append({
+                "sourcetype": "vector",
+                "source": [MUNS_TILES_URL],
+                "sourcelayer": MUNS_TILES_LAYER,
+                "type": "fill",
+                "color": "#e6e6e6",
+                "opacity": 0.6,
+                "below": "traces",
+            })
+
     fig.update_layout(
-        mapbox_style="carto-positron",
-        mapbox_zoom=7.2,
-        mapbox_center=center,
+        map_style="carto-positron",
+        map_zoom=zoom_for_bounds(state_bounds),
+        map_center=center,
+        map_layers=map_layers,
         margin=dict(l=0, r=0, t=0, b=0),
         height=720,
     )
+    return fig
 
-    st.plotly_chart(fig, use_container_width=True)
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def build_map_deck(estado_sel: str, mun_sel: str, estados_key: tuple, muns_key: tuple,
+                   muni_opacity: float, _bundle: tuple):
+    """Variante WebGL (USE_PYDECK=1): dos GeoJsonLayer de deck.gl, base gris
+    y municipio resaltado. Misma política de caché que la figura de plotly.
+    """
+    (gdf_muns_in, gj_muns, _muns_sorted, mun_index, mun_names_arr,
+     _locations, state_bounds) = _bundle
+    feats_sel = mun_index.get(mun_sel, [])
+    base = pdk.Layer(
+        "GeoJsonLayer", data=gj_muns,
+        pickable=True, auto_highlight=True, stroked=True, filled=True,
+        get_fill_color=[230, 230, 230, 150], get_line_color=[163, 163, 163],
+        line_width_min_pixels=1,
+    )
+    sel = pdk.Layer(
+        "GeoJsonLayer", data={"type": "FeatureCollection", "features": feats_sel},
+        stroked=True, filled=True,
+        get_fill_color=[255, 204, 0, int(255 * muni_opacity)],
+        get_line_color=[0, 0, 0], line_width_min_pixels=2,
+    )
+    sel_center, _lons, _lats = selected_muni_outline(
+        estado_sel, mun_sel, estados_key, muns_key,
+        gdf_muns_in[mun_names_arr == mun_sel],
+    )
+    if sel_center is not None:
+        lat, lon = sel_center
+    elif state_bounds is not None:
+        lat = (state_bounds[1] + state_bounds[3]) / 2.0
+        lon = (state_bounds[0] + state_bounds[2]) / 2.0
+    else:
+        lat, lon = 23.6, -102.5
+    view = pdk.ViewState(latitude=lat, longitude=lon,
+                         zoom=zoom_for_bounds(state_bounds))
+    return pdk.Deck(layers=[base, sel], initial_view_state=view,
+                    map_style="light")
+
+
+with left:
+    st.header("Mapa")
+    if USE_PYDECK and pdk is not None:
+        deck = build_map_deck(
+            estado_sel, str(mun_sel),
+            (str(estados_path), estados_mtime), (str(muns_path), muns_mtime),
+            muni_opacity,
+            (gdf_muns_in, gj_muns, muns_sorted, mun_index, mun_names_arr,
+             mun_locations, state_bounds),
+        )
+        st.pydeck_chart(deck, use_container_width=True)
+    else:
+        fig = build_map_figure(
+            estado_sel, str(mun_sel),
+            (str(estados_path), estados_mtime), (str(muns_path), muns_mtime),
+            estado_outline_width, muni_line_width, muni_opacity,
+            gdf_estados, estado_col, mun_col,
+            (gdf_muns_in, gj_muns, muns_sorted, mun_index, mun_names_arr,
+             mun_locations, state_bounds),
+        )
+        st.plotly_chart(fig, use_container_width=True)
 
 # -------------------------------
-# Notas/ayuda
+# Diagnóstico y notas/ayuda
 # -------------------------------
+with st.expander("Diagnóstico de datos"):
+    st.write("**Estados**", data_summary((str(estados_path), estados_mtime), gdf_estados))
+    st.write("**Municipios**", data_summary((str(muns_path), muns_mtime), gdf_muns))
+
 with st.expander("Ayuda y notas"):
     st.markdown(
         """
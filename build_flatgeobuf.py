@@ -0,0 +1,33 @@
+"""Convierte los GeoJSON por estado a FlatGeobuf (.fgb), binario e indexado.
+
+GeoJSON es texto: cada carga vuelve a tokenizar números y llaves. FlatGeobuf
+se lee como mmap + decodificación struct y trae un R-tree Hilbert empacado,
+así que las lecturas filtradas por bbox (`gpd.read_file(path, bbox=...)`)
+saltan las features irrelevantes sin costo extra.
+
+Uso (offline):
+    python build_flatgeobuf.py
+
+La app de GeoPandas prefiere `data/<Estado>.fgb` si existe junto al `.json`.
+"""
+from pathlib import Path
+
+import geopandas as gpd
+
+DATA_DIR = Path("data")
+# Archivos base de la otra app (no son por-estado)
+SKIP_STEMS = {"states", "municipalities", "mx_estados", "mx_municipios"}
+
+
+def main():
+    for path in sorted(DATA_DIR.glob("*.json")):
+        if path.stem in SKIP_STEMS:
+            continue
+        out = path.with_suffix(".fgb")
+        gpd.read_file(path).to_file(out, driver="FlatGeobuf")
+        print(f"{path.name} -> {out.name} "
+              f"({path.stat().st_size // 1024} KB -> {out.stat().st_size // 1024} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Convierte los GeoJSON por estado a GeoParquet (.parquet), columnar y binario.
+
+Parquet evita re-tokenizar texto en cada arranque: geometrías WKB y columnas
+tipadas se leen vía Arrow en una fracción del tiempo del JSON. Requiere
+pyarrow (pip install pyarrow) además de geopandas.
+
+Uso (offline):
+    python build_geoparquet.py
+
+La app de GeoPandas prefiere `data/<Estado>.parquet` sobre cualquier otro
+formato del mismo estado.
+"""
+from pathlib import Path
+
+import geopandas as gpd
+
+DATA_DIR = Path("data")
+# Archivos base de la otra app (no son por-estado)
+SKIP_STEMS = {"states", "municipalities", "mx_estados", "mx_municipios"}
+
+
+def main():
+    for path in sorted(DATA_DIR.glob("*.json")):
+        if path.stem in SKIP_STEMS:
+            continue
+        out = path.with_suffix(".parquet")
+        gpd.read_file(path).to_parquet(out)
+        print(f"{path.name} -> {out.name} "
+              f"({path.stat().st_size // 1024} KB -> {out.stat().st_size // 1024} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Genera data/_meta.parquet: municipios y bounds por estado, precalculados.
+
+La barra de selección solo necesita la lista de municipios y el encuadre del
+estado, pero hoy eso obliga a parsear el GeoJSON completo (~MB) antes de
+pintar nada. Este script guarda esos datos en un Parquet diminuto (una fila
+por estado) que la app lee en milisegundos; el GeoJSON completo solo se
+parsea para dibujar el mapa.
+
+Uso (una sola vez, offline; repetir si cambian los datos):
+    python build_meta.py
+
+Requiere geopandas y pyarrow.
+"""
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+
+DATA_DIR = Path("data")
+META_PATH = DATA_DIR / "_meta.parquet"
+# Archivos base de la otra app (no son por-estado)
+SKIP_STEMS = {"states", "municipalities", "mx_estados", "mx_municipios"}
+# Mismo orden de preferencia que feat_mun_name en la app
+NAME_KEYS = ("NOMGEO", "nom_mun", "MUNICIPIO", "NOM_MUN", "NOM_MPIO", "NOM_LOC")
+
+
+def main():
+    rows = []
+    for path in sorted(DATA_DIR.glob("*.json")):
+        if path.stem in SKIP_STEMS:
+            continue
+        gdf = gpd.read_file(path)
+        name_col = next((k for k in NAME_KEYS if k in gdf.columns), None)
+        muns = sorted(gdf[name_col].astype(str).unique()) if name_col else []
+        rows.append({
+            "state": path.stem,
+            "muns": muns,
+            "bounds": list(gdf.total_bounds),
+        })
+        print(f"{path.name}: {len(muns)} municipios")
+
+    pd.DataFrame(rows).to_parquet(META_PATH, index=False)
+    print(f"-> {META_PATH} ({META_PATH.stat().st_size // 1024} KB)")
+
+
+if __name__ == "__main__":
+    main()
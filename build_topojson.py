@@ -0,0 +1,46 @@
+"""Pre-procesa los GeoJSON por estado a TopoJSON cuantizado y simplificado.
+
+Los límites municipales comparten fronteras con sus vecinos: en GeoJSON cada
+frontera se guarda dos veces. TopoJSON guarda cada arco una sola vez, permite
+simplificar sin abrir huecos entre vecinos y cuantiza las coordenadas a
+enteros, reduciendo 60-80% los bytes que viajan al navegador.
+
+Uso (una sola vez, offline):
+    python build_topojson.py [--toposimplify 0.0005] [--prequantize 100000]
+
+Requiere el paquete `topojson` (pip install topojson) además de geopandas.
+La app prefiere `data/<Estado>.topojson` si existe junto al `.json`.
+"""
+import argparse
+from pathlib import Path
+
+import geopandas as gpd
+import topojson
+
+DATA_DIR = Path("data")
+# Archivos base de la otra app (no son por-estado)
+SKIP_STEMS = {"states", "municipalities", "mx_estados", "mx_municipios"}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--toposimplify", type=float, default=0.0005,
+                    help="Tolerancia de simplificación sobre los arcos (grados)")
+    ap.add_argument("--prequantize", type=float, default=1e5,
+                    help="Rejilla de cuantización de coordenadas")
+    args = ap.parse_args()
+
+    for path in sorted(DATA_DIR.glob("*.json")):
+        if path.stem in SKIP_STEMS:
+            continue
+        gdf = gpd.read_file(path)
+        topo = topojson.Topology(gdf, prequantize=args.prequantize,
+                                 toposimplify=args.toposimplify)
+        out = path.with_suffix(".topojson")
+        out.write_text(topo.to_json(), encoding="utf-8")
+        print(f"{path.name} -> {out.name} "
+              f"({path.stat().st_size // 1024} KB -> {out.stat().st_size // 1024} KB)")
+
+
+if __name__ == "__main__":
+    main()
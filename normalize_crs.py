@@ -0,0 +1,34 @@
+"""Normaliza (una sola vez, offline) los archivos de data/ a EPSG:4326.
+
+La app reproyectaba en caliente con `to_crs(4326)` en cada carga: una pasada
+de PROJ sobre cada vértice que no aporta nada si los datos ya se publican en
+WGS84. Este script reproyecta los archivos que lo necesiten y reescribe solo
+esos; con los datos normalizados, la reproyección en la app queda como red de
+seguridad para archivos subidos por el usuario.
+
+Uso:
+    python normalize_crs.py
+"""
+from pathlib import Path
+
+import geopandas as gpd
+
+DATA_DIR = Path("data")
+
+
+def main():
+    for path in sorted(list(DATA_DIR.glob("*.json")) + list(DATA_DIR.glob("*.geojson"))):
+        gdf = gpd.read_file(path)
+        if gdf.crs is None:
+            print(f"{path.name}: sin CRS, se asume WGS84 (no se reescribe)")
+            continue
+        epsg = gdf.crs.to_epsg()
+        if epsg == 4326:
+            print(f"{path.name}: ya en EPSG:4326")
+            continue
+        gdf.to_crs(4326).to_file(path, driver="GeoJSON")
+        print(f"{path.name}: reproyectado de EPSG:{epsg} a EPSG:4326")
+
+
+if __name__ == "__main__":
+    main()